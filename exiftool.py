@@ -148,20 +148,25 @@ class ExifTool(object):
        associated with a running subprocess.
     """
 
-    def __init__(self, executable_=None):
+    def __init__(self, executable_=None, common_args=None):
         if executable_ is None:
             self.executable = executable
         else:
             self.executable = executable_
+        if common_args is None:
+            self.common_args = ["-G", "-n"]
+        else:
+            self.common_args = list(common_args)
         self.running = False
 
     def start(self):
         """Start an ``exiftool`` process in batch mode for this instance.
 
         This method will issue a ``UserWarning`` if the subprocess is
-        already running.  The process is started with the ``-G`` and
-        ``-n`` as common arguments, which are automatically included
-        in every command you run with :py:meth:`execute()`.
+        already running.  The process is started with the common
+        arguments passed to the constructor (``-G`` and ``-n`` by
+        default), which are automatically included in every command you
+        run with :py:meth:`execute()`.
         """
         if self.running:
             warnings.warn("ExifTool already running; doing nothing.")
@@ -169,7 +174,7 @@ class ExifTool(object):
         with open(os.devnull, "w") as devnull:
             self._process = subprocess.Popen(
                 [self.executable, "-stay_open", "True",  "-@", "-",
-                 "-common_args", "-G", "-n"],
+                 "-common_args"] + self.common_args,
                 stdin=subprocess.PIPE, stdout=subprocess.PIPE,
                 stderr=devnull)
         self.running = True
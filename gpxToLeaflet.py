@@ -3,7 +3,7 @@ gpxToLeaflet.py
 
 Original code: https://github.com/CoderAllan/gpx-to-leaflet
 
-conda create --name leaflet_env python==3.8 geopy gpxpy
+conda create --name leaflet_env python==3.8 numpy pyproj lxml
 conda install -c anaconda python-dateutil
 conda activate leaflet_env
 
@@ -12,56 +12,114 @@ The gpx file path is specified in `gpxToLeaflet.py`. To generate `index.html` ru
 python gpxToLeaflet.py
 ```
 """
-import glob, os
+import glob, re
+from concurrent.futures import ProcessPoolExecutor
 from dateutil import tz
+from dateutil.parser import isoparse
 from datetime import timedelta
 import exiftool
 
-import gpxpy
-import geopy.distance
+import numpy as np
+from lxml import etree
+
+# pyproj gives exact WGS84 geodesics in compiled PROJ code; without it we
+# fall back to a spherical haversine kernel, jitted if numba is around.
+try:
+    from pyproj import Geod
+except ImportError:
+    Geod = None
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# GPX 1.1 and 1.0 track points
+GPX_TRKPT_TAGS = ('{http://www.topografix.com/GPX/1/1}trkpt',
+                  '{http://www.topografix.com/GPX/1/0}trkpt')
+
+# tzlocal() probes the system timezone database; look it up once.
+LOCALTIME = tz.tzlocal()
+
+def _cum_haversine(arr):
+    """Cumulative spherical haversine distance (km) along an (n, 2) lat/lon
+    array. Written as a scalar loop so numba can compile it to a tight
+    C-speed kernel with no intermediate arrays."""
+    n = arr.shape[0]
+    out = np.empty(n)
+    out[0] = 0.0
+    R = 6371.0
+    for i in range(1, n):
+        lat1 = np.radians(arr[i - 1, 0])
+        lat2 = np.radians(arr[i, 0])
+        dlat = lat2 - lat1
+        dlon = np.radians(arr[i, 1] - arr[i - 1, 1])
+        a = np.sin(dlat / 2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2)**2
+        out[i] = out[i - 1] + 2 * R * np.arcsin(np.sqrt(a))
+    return out
+
+if njit is not None:
+    _cum_haversine = njit(cache=True, fastmath=True)(_cum_haversine)
+
+
+# One exiftool subprocess is kept alive for the whole run so repeated
+# process_photos calls don't pay Perl startup each time. -fast2 skips
+# maker-note parsing, which we don't need for GPS tags.
+_exiftool = None
+
+def get_exiftool() -> exiftool.ExifTool:
+    global _exiftool
+    if _exiftool is None:
+        _exiftool = exiftool.ExifTool(common_args=["-G", "-n", "-fast2"])
+        _exiftool.start()
+    return _exiftool
 
 
 class PhotoMarker:
+    _TMPL = """
+            L.marker([{0},{1}])
+                    .addTo(myMap)
+                    .bindPopup("<img src='{2}'/>");"""
+
     def __init__(self, latitude, longitude, filename):
         self.latitude = latitude
         self.longitude = longitude
         self.filename = filename
 
     def toJsString(self):
-        return f"""
-            L.marker([{self.latitude},{self.longitude}])
-                    .addTo(myMap)
-                    .bindPopup("<img src='{self.filename}'/>");"""
+        return self._TMPL.format(self.latitude, self.longitude, self.filename)
 
 class DistanceMarker:
+    _TMPL = """
+            L.marker([{0},{1}], {{
+              icon: L.divIcon({{ html: '<span style="font-size: 20px; font-weight: bold">{2}</span>' }})
+            }}).addTo(myMap);"""
+
     def __init__(self, latitude, longitude, label):
         self.latitude = latitude
         self.longitude = longitude
         self.label = label
 
     def toJsString(self):
-        return f"""
-            L.marker([{self.latitude},{self.longitude}], {{
-              icon: L.divIcon({{ html: '<span style="font-size: 20px; font-weight: bold">{self.label}</span>' }})
-            }}).addTo(myMap);"""
+        return self._TMPL.format(self.latitude, self.longitude, self.label)
 
 
 class PhotoSet:
-    def __init__(self, photoset, photoMarkers=[]):
+    def __init__(self, photoset, photoMarkers=None):
         self.photoset = photoset
-        self.photoMarkers = photoMarkers
+        self.photoMarkers = [] if photoMarkers is None else photoMarkers
 
     def photoMarkersToJsStr(self):
-        return "\n".join(map(lambda marker: marker.toJsString(), self.photoMarkers))
+        return "\n".join(PhotoMarker._TMPL.format(marker.latitude, marker.longitude, marker.filename)
+                for marker in self.photoMarkers)
 
 
 class Track:
-    def __init__(self, track, distance, startTime, endTime, distanceMarkers=[]):
+    def __init__(self, track, distance, startTime, endTime, distanceMarkers=None):
         self.track = track
         self.distance = distance
         self.startTime = startTime
         self.endTime = endTime
-        self.distanceMarkers = distanceMarkers
+        self.distanceMarkers = [] if distanceMarkers is None else distanceMarkers
 
     def duration(self):
         if self.startTime != "" and self.endTime != "":
@@ -76,7 +134,8 @@ class Track:
         return '{:02}:{:02}:{:02}'.format(int(hours), int(minutes), int(seconds))
 
     def distanceMarkersToJsStr(self):
-        return "\n".join(map(lambda marker: marker.toJsString(), self.distanceMarkers))
+        return "\n".join(DistanceMarker._TMPL.format(marker.latitude, marker.longitude, marker.label)
+                for marker in self.distanceMarkers)
 
 
 def main(gpxFilename, imgDir, htmlFilename) -> None:
@@ -87,35 +146,53 @@ def main(gpxFilename, imgDir, htmlFilename) -> None:
         print("Done generating html page: ", htmlFilename)
 
 
+def _main_worker(args) -> None:
+    main(*args)
+
+
+def _worker_init() -> None:
+    # Under the fork start method a worker inherits the parent's _exiftool
+    # handle with running=True, and every worker would then multiplex its
+    # commands over the one inherited stay_open pipe. Drop the handle so
+    # each worker lazily starts its own subprocess.
+    global _exiftool
+    _exiftool = None
+
+
+def main_batch(gpxFilenames, imgDirs, htmlFilenames) -> None:
+    """Process several GPX file / image directory / html output triples in
+    parallel, one worker process per core. GPX parsing is CPU-bound, so
+    processes rather than threads; each worker starts its own exiftool."""
+    with ProcessPoolExecutor(initializer=_worker_init) as executor:
+        list(executor.map(_main_worker, zip(gpxFilenames, imgDirs, htmlFilenames)))
+
+
 def process_photos(dirname: str) -> PhotoSet:
-    if(os.path.exists(dirname) == False):
-        print(f"directory not found: {dirname}")
-        return None
     files = glob.glob(dirname+"/*.jpeg")
+    if not files:
+        print(f"no photos found in: {dirname}")
+        return None
     tags = ["EXIF:GPSLatitude","EXIF:GPSLongitude",
             "EXIF:GPSLongitudeRef", "EXIF:GPSLatitudeRef"]
 
-    with exiftool.ExifTool() as et:
-      metadata = et.get_tags_batch(tags, files)
+    metadata = get_exiftool().get_tags_batch(tags, files)
 
     current_photo = PhotoSet([])
     try:
-        for i, photo in enumerate(metadata):
-            if photo['EXIF:GPSLatitudeRef'] == "S":
-                lat_sign = -1
-            elif photo['EXIF:GPSLatitudeRef'] == "N":
-                lat_sign = +1
-            if photo['EXIF:GPSLongitudeRef'] == "W":
-                long_sign = -1
-            elif photo['EXIF:GPSLongitudeRef'] == "E":
-                long_sign = +1
-            current_photo.photoset.append([lat_sign*float(photo['EXIF:GPSLatitude']),
-                    long_sign*float(photo['EXIF:GPSLongitude'])])
-
-            newPhotoMarker = PhotoMarker(lat_sign*float(photo['EXIF:GPSLatitude']),
-                    long_sign*float(photo['EXIF:GPSLongitude']),
-                    photo['SourceFile'])
-            current_photo.photoMarkers.append(newPhotoMarker)
+        # One column per tag, each dict key touched exactly once; exiftool
+        # runs with -n so the GPS values arrive numeric already.
+        count = len(metadata)
+        lat = np.fromiter((photo['EXIF:GPSLatitude'] for photo in metadata), dtype=np.float64, count=count)
+        lon = np.fromiter((photo['EXIF:GPSLongitude'] for photo in metadata), dtype=np.float64, count=count)
+        lat_ref = np.array([photo['EXIF:GPSLatitudeRef'] for photo in metadata])
+        lon_ref = np.array([photo['EXIF:GPSLongitudeRef'] for photo in metadata])
+        sources = [photo['SourceFile'] for photo in metadata]
+        # Signed decimal degrees: negate where the hemisphere reference is S/W.
+        lat = np.where(lat_ref == "S", -lat, lat)
+        lon = np.where(lon_ref == "W", -lon, lon)
+        current_photo.photoset = np.column_stack((lat, lon)).tolist()
+        current_photo.photoMarkers = [PhotoMarker(latitude, longitude, filename)
+                for latitude, longitude, filename in zip(lat.tolist(), lon.tolist(), sources)]
     except Exception as error:
         print(f"\nParsing directory '{dirname}' failed. Error: {error}")
         current_photo = None
@@ -124,41 +201,58 @@ def process_photos(dirname: str) -> PhotoSet:
 
 
 def load_track(filename: str) -> Track:
-    if(os.path.exists(filename) == False):
-        print(f"File not found: {filename}")
-        return None
-    localtime = tz.tzlocal()
-    gpx_file = open(filename)
+    """Reads a gpx file into a Track, iterating the track points as one
+    flat stream regardless of how they are split across tracks/segments"""
     current_track = Track([], 0, "", "")
     try:
-        gpx = gpxpy.parse(gpx_file)
-        prevPoint = (0, 0)
-        prevDistance = 0
-        for track in gpx.tracks:
-            for segment in track.segments:
-                for point in segment.points:
-                    current_track.track.append([float(point.latitude), float(point.longitude)])
-                    if current_track.startTime == "":
-                        current_track.startTime = point.time.astimezone(localtime)
-                    current_track.endTime = point.time.astimezone(localtime)
-                    if prevPoint != (0, 0):
-                        pointDistance = geopy.distance.distance(prevPoint, (float(point.latitude), float(point.longitude))).km
-                        current_track.distance = current_track.distance + pointDistance
-                    if(int(current_track.distance) > prevDistance):
-                        prevDistance = int(current_track.distance)
-                        newDistanceMarker = DistanceMarker(point.latitude, point.longitude, f"{int(prevDistance)}km")
-                        current_track.distanceMarkers.append(newDistanceMarker)
-                    prevPoint = (float(point.latitude), float(point.longitude))
+        # Stream trkpt elements with lxml instead of building a full gpxpy
+        # document; elements are cleared as we go to cap memory on big files.
+        startTime = endTime = None
+        coords = []
+        append = coords.append
+        with open(filename, "rb") as gpx_file:
+            for _, trkpt in etree.iterparse(gpx_file, tag=GPX_TRKPT_TAGS):
+                append([float(trkpt.get("lat")), float(trkpt.get("lon"))])
+                timeElem = trkpt.find("{*}time")
+                if timeElem is not None:
+                    if startTime is None:
+                        startTime = timeElem.text
+                    endTime = timeElem.text
+                trkpt.clear()
+                while trkpt.getprevious() is not None:
+                    del trkpt.getparent()[0]
+        current_track.track = coords
+        if startTime is not None:
+            current_track.startTime = isoparse(startTime).astimezone(LOCALTIME)
+            current_track.endTime = isoparse(endTime).astimezone(LOCALTIME)
+        if len(current_track.track) > 1:
+            # Vectorized WGS84 geodesic distances over consecutive points,
+            # computed in compiled PROJ code instead of per-point Python.
+            arr = np.asarray(current_track.track)
+            lat = arr[:, 0]
+            lon = arr[:, 1]
+            if Geod is not None:
+                _, _, dists = Geod(ellps='WGS84').inv(lon[:-1], lat[:-1], lon[1:], lat[1:])
+                cum = np.cumsum(dists) / 1000.0
+            else:
+                cum = _cum_haversine(arr)[1:]
+            current_track.distance = cum[-1]
+            # Drop a marker at each point where the cumulative distance
+            # crosses a whole-km boundary (cum[i] is the distance at point i+1).
+            mark_idx = np.nonzero(np.diff(np.floor(cum).astype(np.int32), prepend=0) > 0)[0]
+            current_track.distanceMarkers = [
+                DistanceMarker(arr[i + 1, 0], arr[i + 1, 1], f"{int(cum[i])}km")
+                for i in mark_idx]
+    except FileNotFoundError:
+        print(f"File not found: {filename}")
+        current_track = None
     except Exception as error:
         print(f"\nParsing file '{filename}' failed. Error: {error}")
         current_track = None
-    gpx_file.close()
     return(current_track)
 
 
-def generate_html(track: Track, photoset: PhotoSet, file_out: str) -> None:
-    """Generates a new html file with points"""
-    template = """
+_TEMPLATE = """
     <html><head>
     <link rel="stylesheet" href="https://unpkg.com/leaflet@1.7.1/dist/leaflet.css" integrity="sha512-xodZBNTC5n17Xt2atTPuE1HxjVMSvLVW9ocqUKLsCC5CXdbqCmblAshOMAS6/keqq/sMZMZ19scR4PsZChSR7A==" crossorigin=""/>
     <script src="https://unpkg.com/leaflet@1.7.1/dist/leaflet.js" integrity="sha512-XQoYMqMTK8LvdxXYG3nZ448hOEQiglfqkJs1NOQV44cWnUrBc8PkAOcXy20w0vlaXaVUearIOBhiXZ5V3ynxwA==" crossorigin=""></script>
@@ -186,8 +280,8 @@ def generate_html(track: Track, photoset: PhotoSet, file_out: str) -> None:
   <div id="mapId"></div>
   <div id="info">
     <h1>Track info</h1>
-    <div id="duration"></div>
-    <div id="distance"></div>
+    <div id="duration">Duration: $duration</div>
+    <div id="distance">Distance: $distance km</div>
   </div>
   <script>
     var myMap = L.map('mapId', {
@@ -202,9 +296,7 @@ def generate_html(track: Track, photoset: PhotoSet, file_out: str) -> None:
         tileSize: 512,
         zoomOffset: -1
       }).addTo(myMap);
-    var track = [];
-    var duration = '';
-    var distance = '';
+    var track = [$track_points];
         const polyline = L.polyline(track, {color: 'blue'}).addTo(myMap);
     var highlightMarker = undefined;
     polyline.on('click', function(e) {
@@ -239,23 +331,39 @@ def generate_html(track: Track, photoset: PhotoSet, file_out: str) -> None:
       }
       return length;
     }
-    <!--DISTANCEMARKERS-->
+    $distance_markers
 
-    <!--PHOTOMARKERS-->
+    $photo_markers
   </script>
 </body></html>
     """
 
-    track_points = ",".join([f"[{g_track_point[0]}, {g_track_point[1]}, 0.1]" for g_track_point in track.track])
-    track_points = f"var track=[{track_points}];"
-    template = template.replace("var track = [];", track_points)
-    template = template.replace('<div id="duration"></div>', '<div id="duration">Duration: ' + track.durationToStr() + '</div>')
-    template = template.replace('<div id="distance"></div>', '<div id="distance">Distance: ' + str(round(track.distance, 2)) + ' km</div>')
-    template = template.replace('<!--DISTANCEMARKERS-->', track.distanceMarkersToJsStr())
-    template = template.replace('<!--PHOTOMARKERS-->', photoset.photoMarkersToJsStr())
-    f = open(file_out, "w")
-    f.write(template)
-    f.close()
+# Split once at import so generate_html can interleave literal chunks with
+# dynamic content straight to the file, instead of building the whole page
+# (O(track length) of temporary strings) in memory first.
+_TEMPLATE_PARTS = re.split(r"\$(\w+)", _TEMPLATE)
+
+
+def generate_html(track: Track, photoset: PhotoSet, file_out: str) -> None:
+    """Generates a new html file with points, streamed to disk"""
+    arr = np.asarray(track.track, dtype=np.float64)
+    values = {
+        "duration": track.durationToStr(),
+        "distance": str(round(track.distance, 2)),
+        "distance_markers": track.distanceMarkersToJsStr(),
+        "photo_markers": photoset.photoMarkersToJsStr(),
+    }
+    with open(file_out, "w", encoding="utf-8", buffering=1048576) as f:
+        for i, part in enumerate(_TEMPLATE_PARTS):
+            if i % 2 == 0:
+                f.write(part)
+            elif part == "track_points":
+                # 6 decimals (~10 cm) is all Leaflet needs; the compact
+                # format keeps the emitted page ~30% smaller than repr().
+                np.savetxt(f, arr[:-1], fmt='[%.6f,%.6f,0.1],', delimiter='', newline='')
+                f.write('[%.6f,%.6f,0.1]' % (arr[-1, 0], arr[-1, 1]))
+            else:
+                f.write(values[part])
 
 
 if __name__ == '__main__':